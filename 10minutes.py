@@ -1,75 +1,84 @@
-import json
+import sys
 import asyncio
+import logging
 from datetime import datetime, timedelta
-from m3u8 import scrape_m3u8
 
+from log_config import setup_logging
+import match_times
+from m3u8 import scrape_m3u8, shutdown
 
-def load_matches(filename='footystream_matches.json'):
-    """Load matches from JSON file"""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"❌ Could not load {filename}")
-        return []
+log = logging.getLogger(__name__)
+
+# Upper bound on headless browser scrapes running at the same time
+MAX_CONCURRENT_SCRAPES = 10
 
+# Bounds in seconds on the monitor's sleep between passes
+MIN_SLEEP = 5
+MAX_SLEEP = 300
 
-def save_matches(matches, filename='footystream_matches.json'):
-    """Save matches to JSON file"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(matches, f, indent=2, ensure_ascii=False)
+# Fetch window in seconds relative to kick-off, ±10 minutes
+WINDOW = (-600, 600)
 
 
-def is_within_10_minutes(match_datetime_str):
+def is_within_10_minutes(match):
     """
     Check if match time is within 10 minutes range (before or after current time)
     This allows scraping matches that are already live
     
     Args:
-        match_datetime_str: ISO format datetime string
+        match: Match dict with its parsed '_dt' datetime (see match_times.parse_match_datetimes)
         
     Returns:
         bool: True if within ±10 minutes, False otherwise
     """
-    try:
-        match_time = datetime.fromisoformat(match_datetime_str.replace('Z', '+00:00'))
-        now = datetime.now(match_time.tzinfo) if match_time.tzinfo else datetime.now()
-        
-        time_diff = match_time - now
-        
-        # Check if match is within 10 minutes before OR after (±10 minutes range)
-        return timedelta(minutes=-10) <= time_diff <= timedelta(minutes=10)
-        
-    except Exception as e:
-        print(f"⚠ Error parsing datetime: {e}")
+    match_time = match.get('_dt')
+    if match_time is None:
         return False
+    
+    now = datetime.now(match_time.tzinfo) if match_time.tzinfo else datetime.now()
+    time_diff = match_time - now
+    
+    # Check if match is within 10 minutes before OR after (±10 minutes range)
+    return timedelta(seconds=WINDOW[0]) <= time_diff <= timedelta(seconds=WINDOW[1])
 
 
-async def get_working_m3u8(stream_links):
+async def get_working_m3u8(stream_links, semaphore=None):
     """
-    Try each stream link until we find one that returns a valid m3u8 URL
+    Try all stream links concurrently and return the first valid m3u8 URL
     
     Args:
         stream_links: List of stream URLs to try
+        semaphore: Optional semaphore bounding concurrent scrapes
         
     Returns:
         tuple: (m3u8_url, working_embed_url) if found, (None, None) otherwise
     """
-    for i, link in enumerate(stream_links, 1):
-        print(f"   Trying link {i}/{len(stream_links)}: {link}")
-        
-        try:
-            m3u8_url = await scrape_m3u8(link)
+    semaphore = semaphore or asyncio.BoundedSemaphore(MAX_CONCURRENT_SCRAPES)
+    
+    async def try_link(i, link):
+        async with semaphore:
+            log.debug("   Trying link %d/%d: %s", i, len(stream_links), link)
+            try:
+                return await scrape_m3u8(link), link
+            except Exception as e:
+                log.warning("   ❌ Error on %s: %s", link, e)
+                return None, link
+    
+    tasks = [asyncio.create_task(try_link(i, link)) for i, link in enumerate(stream_links, 1)]
+    
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            m3u8_url, link = await next_done
             
-            if m3u8_url:
-                print(f"   ✅ Found working m3u8 URL!")
+            if m3u8_url and m3u8_url.get('m3u8'):
+                log.debug("   ✅ Found working m3u8 URL!")
                 return m3u8_url, link  # Return both m3u8 URL and the working embed URL
             else:
-                print(f"   ❌ No m3u8 found")
-                
-        except Exception as e:
-            print(f"   ❌ Error: {e}")
-            continue
+                log.debug("   ❌ No m3u8 found for %s", link)
+    finally:
+        # Stop the remaining scrapes once one link has worked
+        for task in tasks:
+            task.cancel()
     
     return None, None
 
@@ -78,30 +87,27 @@ async def update_match_m3u8():
     """
     Check all matches and update m3u8 URLs for those starting within 10 minutes
     """
-    print("🔍 Checking matches for m3u8 updates...")
-    print("="*70 + "\n")
+    log.info("🔍 Checking matches for m3u8 updates...")
+    log.info("=" * 70)
     
     # Load matches
-    matches = load_matches()
+    matches = match_times.load_matches()
     
     if not matches:
-        print("No matches found in file")
+        log.info("No matches found in file")
         return
     
-    print(f"Loaded {len(matches)} matches\n")
+    log.info("Loaded %d matches", len(matches))
     
-    updated_count = 0
+    eligible = []
     
     for match in matches:
-        doc_id = match.get('doc_id', 'unknown')
         title = match.get('title', 'Unknown match')
-        datetime_str = match.get('dateTime', '')
         stream_links = match.get('stream_links', [])
         
         # Skip if already has m3u8 URL
         if match.get('m3u8_url'):
-            print(f"⏭️  {title}")
-            print(f"   Already has m3u8 URL - skipping\n")
+            log.debug("⏭️  %s - already has m3u8 URL, skipping", title)
             continue
         
         # Skip if no stream links
@@ -109,37 +115,48 @@ async def update_match_m3u8():
             continue
         
         # Check if within 10 minutes
-        if not is_within_10_minutes(datetime_str):
+        if not is_within_10_minutes(match):
             continue
         
-        print(f"⏰ {title}")
-        print(f"   Match starting soon - fetching m3u8 URL...")
+        eligible.append(match)
+    
+    # One semaphore shared by every (match, link) scrape in this run
+    semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_SCRAPES)
+    
+    async def process(match):
+        title = match.get('title', 'Unknown match')
+        
+        log.debug("⏰ %s - match starting soon, fetching m3u8 URL...", title)
         
         # Try to get working m3u8 URL and the embed URL that worked
-        m3u8_url, working_embed_url = await get_working_m3u8(stream_links)
+        m3u8_url, working_embed_url = await get_working_m3u8(match['stream_links'], semaphore)
         
         if m3u8_url:
             # Update match with m3u8 URL and working embed URL
             match['m3u8_url'] = m3u8_url
             match['working_embed_url'] = working_embed_url
             match['m3u8_updated_at'] = datetime.now().isoformat()
-            updated_count += 1
             
-            print(f"   ✅ M3U8 URL: {m3u8_url}")
-            print(f"   ✅ Working Embed: {working_embed_url}\n")
-        else:
-            print(f"   ⚠️  No working m3u8 URL found\n")
+            log.info("✅ %s M3U8 URL: %s", title, m3u8_url)
+            log.info("✅ %s Working Embed: %s", title, working_embed_url)
+            return True
+        
+        log.info("⚠️  %s: No working m3u8 URL found", title)
+        return False
+    
+    results = await asyncio.gather(*[process(match) for match in eligible])
+    updated_count = sum(results)
     
     # Save updated matches
     if updated_count > 0:
-        save_matches(matches)
-        print(f"{'='*70}")
-        print(f"✅ Updated {updated_count} match(es) with m3u8 URLs")
-        print(f"{'='*70}")
+        match_times.save_matches(matches)
+        log.info("=" * 70)
+        log.info("✅ Updated %d match(es) with m3u8 URLs", updated_count)
+        log.info("=" * 70)
     else:
-        print(f"{'='*70}")
-        print(f"ℹ️  No matches needed updating")
-        print(f"{'='*70}")
+        log.info("=" * 70)
+        log.info("ℹ️  No matches needed updating")
+        log.info("=" * 70)
 
 
 async def monitor_and_update(check_interval=60):
@@ -147,10 +164,13 @@ async def monitor_and_update(check_interval=60):
     Continuously monitor matches and update m3u8 URLs
     
     Args:
-        check_interval: Time in seconds between checks (default: 1 minutes)
+        check_interval: Seconds between retries for matches already in the window (default: 1 minute)
+    
+    Between passes the loop sleeps until the next pending match enters the
+    window, bounded to [MIN_SLEEP, MAX_SLEEP] so new matches are still picked up.
     """
     print("🚀 Starting FootyStream M3U8 Fetcher...")
-    print(f"⏱️  Check interval: {check_interval} seconds ({check_interval // 60} minutes)")
+    print(f"⏱️  Retry interval: {check_interval} seconds, idle wake-up at most every {MAX_SLEEP} seconds")
     print(f"🎯 Fetches m3u8 for matches within ±10 minutes of start time")
     print(f"{'='*70}\n")
     
@@ -158,11 +178,15 @@ async def monitor_and_update(check_interval=60):
         try:
             await update_match_m3u8()
             
-            next_check = datetime.now() + timedelta(seconds=check_interval)
+            sleep_for = match_times.seconds_until_next_check(
+                match_times.load_matches(), 'm3u8_url', WINDOW, check_interval, MIN_SLEEP, MAX_SLEEP
+            )
+            
+            next_check = datetime.now() + timedelta(seconds=sleep_for)
             print(f"\n⏳ Next check at: {next_check.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"💤 Sleeping for {check_interval // 60} minutes...\n")
+            print(f"💤 Sleeping for {int(sleep_for)} seconds...\n")
             
-            await asyncio.sleep(check_interval)
+            await asyncio.sleep(sleep_for)
             
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -173,22 +197,26 @@ async def monitor_and_update(check_interval=60):
 
 async def main():
     """Main entry point"""
-    import sys
+    setup_logging()
     
-    if len(sys.argv) > 1 and sys.argv[1] == '--once':
-        # Run once mode
-        print("Running in single-run mode...\n")
-        await update_match_m3u8()
-    else:
-        # Continuous monitoring mode
-        try:
-            await monitor_and_update()
-        except KeyboardInterrupt:
-            print("\n\n👋 M3U8 fetcher stopped by user")
-        except Exception as e:
-            print(f"\n❌ Fatal error: {e}")
-            import traceback
-            traceback.print_exc()
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == '--once':
+            # Run once mode
+            print("Running in single-run mode...\n")
+            await update_match_m3u8()
+        else:
+            # Continuous monitoring mode
+            try:
+                await monitor_and_update()
+            except KeyboardInterrupt:
+                print("\n\n👋 M3U8 fetcher stopped by user")
+            except Exception as e:
+                print(f"\n❌ Fatal error: {e}")
+                import traceback
+                traceback.print_exc()
+    finally:
+        # Close the shared scraper browser
+        await shutdown()
 
 
 if __name__ == "__main__":
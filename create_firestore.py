@@ -1,9 +1,30 @@
 
-import json
 from datetime import datetime, timedelta
-def sync_to_firestore_auto(json_file='footystream_matches.json'):
+
+import storage
+
+# Attempts per Firestore write before it is reported as an error
+MAX_WRITE_ATTEMPTS = 5
+
+
+def is_same_document(match, firestore_data):
+    """
+    Check whether a Firestore document already holds this match, by comparing
+    its content hash with the one stored on the document (see storage.content_hash)
+    """
+    if firestore_data is None:
+        return False
+    
+    return storage.content_hash(match) == firestore_data.get('content_hash')
+
+
+def sync_to_firestore_auto(json_file='footystream_matches.json', matches=None):
     """
     Automatically sync JSON data to Firestore without confirmation
+    
+    Args:
+        json_file: Path to the matches JSON file
+        matches: Already-parsed matches; when given, json_file is not re-read
     """
     try:
         print("\n" + "="*70)
@@ -12,9 +33,9 @@ def sync_to_firestore_auto(json_file='footystream_matches.json'):
         
         print("🤖 Running in automated mode (no confirmation required)")
         
-        # Load JSON data
-        with open(json_file, 'r', encoding='utf-8') as f:
-            matches = json.load(f)
+        # Load JSON data unless the caller already has it in memory
+        if matches is None:
+            matches = storage.load(json_file)
         
         if not matches:
             print("❌ No matches found in JSON file")
@@ -35,55 +56,110 @@ def sync_to_firestore_auto(json_file='footystream_matches.json'):
         print(f"📁 Collection: matches")
         print(f"📊 Loaded {len(matches)} matches from {json_file}\n")
         
-        # STEP 1: Delete all existing documents
-        print(f"🗑️  Deleting all existing documents from 'matches'...")
-        docs = list(collection.stream())
-        deleted_count = 0
-        
-        for doc in docs:
-            doc.reference.delete()
-            deleted_count += 1
-            print(f"  🗑️  Deleted: {doc.id}")
-        
-        print(f"\n✓ Deleted {deleted_count} document(s)\n")
+        # STEP 1: Work out which documents actually need writing
+        print(f"🔍 Comparing with existing documents in 'matches'...")
         
-        # STEP 2: Add all new documents
-        print(f"➕ Adding {len(matches)} new documents to Firestore...")
-        
-        stats = {'added': 0, 'errors': 0}
+        added = updated = errors = 0
+        local = {}
         
         for match in matches:
             doc_id = match.get('doc_id')
             
             if not doc_id:
                 print(f"⚠️  Skipping match without doc_id: {match.get('title', 'Unknown')}")
-                stats['errors'] += 1
+                errors += 1
                 continue
             
-            try:
-                sync_data = match.copy()
-                sync_data['syncedAt'] = datetime.now().isoformat()
-                
-                collection.document(doc_id).set(sync_data)
-                stats['added'] += 1
-                print(f"  ➕ Added: {match.get('title', 'Unknown')} (ID: {doc_id})")
-                
-            except Exception as e:
-                print(f"  ❌ ERROR adding {doc_id}: {e}")
-                stats['errors'] += 1
+            local[doc_id] = match
+        
+        # Document IDs only, paged - stale documents are deleted without downloading their fields
+        existing_ids = {ref.id for ref in collection.list_documents(page_size=500)}
+        
+        # Stored hashes are only needed for documents that are still in the file
+        refs = [collection.document(doc_id) for doc_id in local if doc_id in existing_ids]
+        # Skip the BatchGet when nothing overlaps, the usual case for a new day's matches
+        existing = {
+            snapshot.id: snapshot.to_dict() or {}
+            for snapshot in db.get_all(refs, field_paths=['content_hash'])
+            if snapshot.exists
+        } if refs else {}
+        
+        to_set = [doc_id for doc_id, match in local.items() if not is_same_document(match, existing.get(doc_id))]
+        to_delete = [doc_id for doc_id in existing_ids if doc_id not in local]
+        unchanged = len(local) - len(to_set)
+        
+        print(f"✓ {len(to_set)} to write, {len(to_delete)} to delete, {unchanged} unchanged\n")
+        
+        # Operations that still fail after MAX_WRITE_ATTEMPTS retries
+        failed = []
+        
+        def on_write_error(error, writer):
+            if error.attempts < MAX_WRITE_ATTEMPTS:
+                return True
+            failed.append(error)
+            print(f"  ❌ ERROR writing document: {error.message}")
+            return False
+        
+        # BulkWriter batches operations and commits them in parallel
+        bulk_writer = db.bulk_writer()
+        bulk_writer.on_write_error(on_write_error)
+        
+        # STEP 2: Delete documents for matches that are no longer in the file
+        for doc_id in to_delete:
+            bulk_writer.delete(collection.document(doc_id))
+        
+        # Flush so delete failures can be counted separately from writes
+        bulk_writer.flush()
+        deleted_count = len(to_delete) - len(failed)
+        
+        # STEP 3: Add new documents and update changed ones
+        synced_at = datetime.now().isoformat()
+        
+        for doc_id in to_set:
+            # content_hash matches what the real-time sync writes, so it sees the document as current
+            match = local[doc_id]
+            bulk_writer.set(collection.document(doc_id), {
+                **match,
+                'syncedAt': synced_at,
+                'content_hash': storage.content_hash(match)
+            })
+        
+        # Wait for every queued write to commit
+        delete_failures = len(failed)
+        bulk_writer.close()
+        
+        # Only writes that committed count as added/updated
+        set_failures = {error.operation.reference.id for error in failed[delete_failures:]}
+        for doc_id in to_set:
+            if doc_id in set_failures:
+                continue
+            if doc_id in existing:
+                updated += 1
+            else:
+                added += 1
+        
+        errors += len(failed)
         
         # Print summary
         print("\n" + "="*70)
         print("📊 FIRESTORE SYNC SUMMARY")
         print("="*70)
         print(f"🗑️  Deleted:   {deleted_count}")
-        print(f"➕ Added:     {stats['added']}")
-        print(f"❌ Errors:    {stats['errors']}")
+        print(f"➕ Added:     {added}")
+        print(f"🔄 Updated:   {updated}")
+        print(f"✓  Unchanged: {unchanged}")
+        print(f"❌ Errors:    {errors}")
         print(f"📝 Total:     {len(matches)}")
         print("="*70)
         
-        print("\n✅ Firestore sync completed successfully!")
-        print(f"💾 Firestore collection now contains {stats['added']} document(s)")
+        if failed:
+            if delete_failures:
+                print(f"\n⚠️  {delete_failures} delete(s) failed - they will be retried on the next sync")
+            if set_failures:
+                print(f"\n⚠️  {len(set_failures)} write(s) failed - they will be retried on the next sync")
+        else:
+            print("\n✅ Firestore sync completed successfully!")
+            print(f"💾 Firestore collection now contains {len(local)} document(s)")
         
     except Exception as e:
         print(f"\n❌ Error syncing to Firestore: {e}")
@@ -1,21 +1,47 @@
 import asyncio
-from playwright.async_api import async_playwright
+from playwright.async_api import Error as PlaywrightError, async_playwright
+from retry import retry
+
+
+# Per-attempt cap on launching the browser and downloading the page
+SCRAPE_TIMEOUT = 60
+
+BLOCKED_RESOURCE_TYPES = ('image', 'font', 'stylesheet', 'media')
+
+
+async def block_static_resources(route):
+    """Abort requests for resources the scraper never reads"""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def scrape_footystream():
     """
-    Download the HTML body from footystream.pk
+    Download the HTML body from footystream.pk, retrying navigation errors and timeouts
     """
+    return await retry(
+        _download_body,
+        timeout=SCRAPE_TIMEOUT,
+        exceptions=(PlaywrightError, asyncio.TimeoutError),
+    )
+
+
+async def _download_body():
     async with async_playwright() as p:
         # Launch browser
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
         
+        # Only the markup is needed - skip images, fonts, styles and media
+        await page.route('**/*', block_static_resources)
+        
         print("Navigating to FootyStream...")
-        await page.goto('https://footystream.pk/soccer-streams', wait_until='networkidle')
+        await page.goto('https://footystream.pk/soccer-streams', wait_until='domcontentloaded')
         
-        print("Waiting for page to load completely...")
-        await asyncio.sleep(3)  # Wait additional 3 seconds for any dynamic content
+        print("Waiting for match links to render...")
+        await page.wait_for_selector('a[href^="/events/"]', timeout=15000)
         
         print("Extracting body HTML...")
         
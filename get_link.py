@@ -1,31 +1,61 @@
-import requests
+import logging
+
+import aiohttp
 from bs4 import BeautifulSoup
+from retry import retry
+
+log = logging.getLogger(__name__)
+
+# Responses that are usually transient and worth another attempt
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Set headers to mimic a browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
 
 
-def get_match_links(match_url):
+def create_session():
+    """
+    Create an HTTP session with keep-alive connections for get_match_links
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60)
+    )
+
+
+async def _fetch_html(session, match_url):
+    async with session.get(match_url, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+        # Raise on statuses worth retrying so retry() sees them
+        if response.status in RETRY_STATUSES:
+            response.raise_for_status()
+        
+        if response.status != 200:
+            return None
+        
+        return await response.text()
+
+
+async def get_match_links(session, match_url):
     """
     Get all stream links from a FootyStream match page
     
     Args:
+        session (aiohttp.ClientSession): Shared HTTP session
         match_url (str): The full URL of the match page
         
     Returns:
         list: List of stream URLs found in the table, or empty list if none found
     """
     try:
-        # Set headers to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Make the request
-        response = requests.get(match_url, headers=headers)
+        # Make the request, retrying timeouts and rate-limit/server errors
+        html = await retry(lambda: _fetch_html(session, match_url))
         
-        if response.status_code != 200:
+        if html is None:
             return []
         
         # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(html, 'lxml')
         
         # Find the table
         table = soup.find('table', class_='min-w-full table-auto')
@@ -46,14 +76,17 @@ def get_match_links(match_url):
         return urls
         
     except Exception as e:
-        print(f"Error fetching links: {e}")
+        log.warning("❌ Error fetching links for %s: %s", match_url, e)
         return []
 
 
 # Example usage
 # if __name__ == "__main__":
 #     match_url = "https://footystream.pk/events/everton-vs-sunderland"
-#     links = get_match_links(match_url)
+#     async def run():
+#         async with create_session() as session:
+#             return await get_match_links(session, match_url)
+#     links = asyncio.run(run())
     
 #     print(f"Found {len(links)} links:")
 #     for link in links:
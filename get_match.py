@@ -1,13 +1,22 @@
 import asyncio
-import schedule
-import time
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-import json
+from bs4 import BeautifulSoup, SoupStrainer
 import re
+
+import storage
 from get_html import scrape_footystream
 from create_firestore import sync_to_firestore_auto
 
+# Match page links on the listing page, e.g. /events/everton-vs-sunderland
+_EVENTS_RE = re.compile(r'^/events/')
+
+# Characters dropped from doc IDs, and runs of spaces/hyphens collapsed to one hyphen
+_NON_ID_RE = re.compile(r'[^\w\s-]')
+_HYPHEN_RE = re.compile(r'[-\s]+')
+
+# Image alt texts that are just a placeholder "logo" label, not a team name
+_LOGO_RE = re.compile(r'^(?i:logo)$| logo$')
+
 
 def generate_doc_id(home_team, away_team):
     """
@@ -24,8 +33,8 @@ def generate_doc_id(home_team, away_team):
     doc_id = match_title.lower()
     
     # Replace spaces and special characters with hyphens
-    doc_id = re.sub(r'[^\w\s-]', '', doc_id)
-    doc_id = re.sub(r'[-\s]+', '-', doc_id)
+    doc_id = _NON_ID_RE.sub('', doc_id)
+    doc_id = _HYPHEN_RE.sub('-', doc_id)
     
     # Remove leading/trailing hyphens
     doc_id = doc_id.strip('-')
@@ -46,13 +55,15 @@ def parse_matches_from_html(html_file='body_content.html', filter_date=None):
     with open(html_file, 'r', encoding='utf-8') as f:
         html_content = f.read()
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # Only build the tree for the match links - everything else on the page is skipped
+    strainer = SoupStrainer('a', href=_EVENTS_RE)
+    soup = BeautifulSoup(html_content, 'lxml', parse_only=strainer)
     
     all_matches = []
     filtered_matches = []
     
     # Find all match containers - looking for the parent link that contains the match info
-    match_links = soup.find_all('a', href=re.compile(r'^/events/'))
+    match_links = soup.find_all('a', href=_EVENTS_RE)
     
     print(f"Found {len(match_links)} match links")
     
@@ -69,7 +80,7 @@ def parse_matches_from_html(html_file='body_content.html', filter_date=None):
             date_time = countdown_span.get('data-countdown', '') if countdown_span else ''
             
             # Find all team divs - they contain flex gap-2 items-center
-            team_divs = link.find_all('div', class_=lambda x: x and 'flex' in x and 'gap-2' in x and 'items-center' in x)
+            team_divs = link.select('div.flex.gap-2.items-center')
             
             # Extract team names from the divs
             teams = []
@@ -84,11 +95,11 @@ def parse_matches_from_html(html_file='body_content.html', filter_date=None):
             # Alternative method: find img tags with alt text
             if len(teams) < 2:
                 teams = []
-                team_imgs = link.find_all('img', alt=True)
+                team_imgs = link.select('img[alt]')
                 for img in team_imgs:
                     alt_text = img.get('alt', '')
                     # Skip if it's just "logo" or contains "logo" only
-                    if alt_text and alt_text.lower() != 'logo' and not alt_text.endswith(' logo'):
+                    if alt_text and not _LOGO_RE.search(alt_text):
                         # Remove " logo" suffix if present
                         team_name = alt_text.replace(' logo', '')
                         teams.append(team_name)
@@ -140,9 +151,8 @@ def parse_matches_from_html(html_file='body_content.html', filter_date=None):
 
 
 def save_to_json(matches, filename='footystream_matches.json'):
-    """Save matches to JSON file"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(matches, f, indent=2, ensure_ascii=False)
+    """Save matches to JSON file via a temp file so readers never see a partial write"""
+    storage.save(matches, filename)
     print(f"✓ Data saved to {filename}")
 
 
@@ -195,7 +205,7 @@ async def scrape_matches():
         save_to_json(matches, 'footystream_matches.json')
         
         # Step 4: Automatically sync to Firestore
-        sync_to_firestore_auto('footystream_matches.json')
+        sync_to_firestore_auto('footystream_matches.json', matches=matches)
         
         print("\n✅ Complete workflow finished successfully!")
         print("   ✓ HTML downloaded")
@@ -211,9 +221,27 @@ async def scrape_matches():
         print("="*100 + "\n")
 
 
-def run_scheduled_scrape():
-    """Wrapper to run async scrape in sync context"""
-    asyncio.run(scrape_matches())
+def seconds_until_next_run(hour=6):
+    """Seconds from now until the next daily run at the given hour"""
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def scheduler():
+    """Run the scrape now, then daily at 6 AM, all on one event loop"""
+    # Run immediately on start
+    print("Running initial scrape now...")
+    await scrape_matches()
+    
+    # Keep the scheduler running
+    while True:
+        # Sleep straight through to the next 6 AM run instead of polling
+        print("\n⏳ Waiting for next scheduled run at 06:00 AM...")
+        await asyncio.sleep(seconds_until_next_run())
+        await scrape_matches()
 
 
 def get_match_main():
@@ -226,33 +254,15 @@ def get_match_main():
     print(f"🔥 Firestore: Auto-sync enabled")
     print("="*100 + "\n")
     
-    # Schedule the job to run daily at 6 AM
-    schedule.every().day.at("06:00").do(run_scheduled_scrape)
-    
     print("💡 The script will run immediately, then daily at 6 AM")
     print("💡 Only today's matches will be scraped and saved")
     print("💡 Firestore will be automatically updated after each scrape")
     print("Press Ctrl+C to stop the scheduler\n")
     
-    # Run immediately on start
-    print("Running initial scrape now...")
-    run_scheduled_scrape()
-    
-    # Keep the scheduler running
-    print("\n⏳ Waiting for next scheduled run at 06:00 AM...")
-    
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-        except KeyboardInterrupt:
-            print("\n\n👋 Scheduler stopped by user")
-            break
-        except Exception as e:
-            print(f"\n❌ Scheduler error: {e}")
-            import traceback
-            traceback.print_exc()
-            time.sleep(60)
+    try:
+        asyncio.run(scheduler())
+    except KeyboardInterrupt:
+        print("\n\n👋 Scheduler stopped by user")
 
 
 if __name__ == "__main__":
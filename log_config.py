@@ -0,0 +1,13 @@
+import os
+import sys
+import logging
+
+
+def setup_logging():
+    """
+    Send log records to stdout as bare messages, at the level named by LOGLEVEL
+
+    Summaries are logged at INFO and per-match detail at DEBUG; set
+    LOGLEVEL=DEBUG to see it.
+    """
+    logging.basicConfig(level=os.environ.get('LOGLEVEL', 'INFO'), format='%(message)s', stream=sys.stdout)
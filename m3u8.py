@@ -1,16 +1,169 @@
 import asyncio
-from playwright.async_api import async_playwright
+import html
+import re
+from urllib.parse import urljoin
+
+import aiohttp
+from playwright.async_api import Error as PlaywrightError, async_playwright
+from retry import retry
 
 real_chrome = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 
-async def scrape_m3u8(url):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=False,
-            # executable_path=real_chrome
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+M3U8_RE = re.compile(rb'https?://[^"\'\s<>]+?\.m3u8[^"\'\s<>]*')
+SCRIPT_SRC_RE = re.compile(rb'<script[^>]+src=["\']([^"\']+)["\']', re.IGNORECASE)
+
+# Per-attempt cap on a browser scrape: navigation plus the 20s wait for the m3u8 XHR
+BROWSER_SCRAPE_TIMEOUT = 60
+
+# Number of referenced scripts searched when the embed HTML has no m3u8
+MAX_SCRIPTS = 2
+
+# Distinct m3u8 URLs per page that are fetched to check they are real playlists
+MAX_CANDIDATES = 3
+
+# Shared across every scrape_m3u8 call; only a fresh context is opened per URL
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+
+# Shared HTTP session for the fast path
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10),
         )
+    return _session
+
+
+async def _get_browser():
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(
+                headless=False,
+                # executable_path=real_chrome
+            )
+        return _browser
+
+
+async def shutdown():
+    """Close the shared HTTP session and browser, and stop Playwright"""
+    global _playwright, _browser, _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+    async with _browser_lock:
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+
+
+async def _fetch_body(session, url, referer):
+    async with session.get(url, headers={**HEADERS, 'Referer': referer}) as response:
+        if response.status != 200:
+            return None
+        # JSON-escaped URLs ("https:\/\/...") are common in inline player configs
+        return (await response.read()).replace(b'\\/', b'/')
+
+
+def _decode_m3u8_url(raw):
+    """Undo HTML-attribute (&amp;) and JSON (\\u0026) escaping of a URL found in page source"""
+    return html.unescape(raw.decode().replace('\\u0026', '&'))
+
+
+async def _is_playlist(session, m3u8_url, referer):
+    """Check that m3u8_url serves an HLS playlist, not an error page or a dead link"""
+    async with session.get(m3u8_url, headers={**HEADERS, 'Referer': referer}) as response:
+        if response.status != 200:
+            return False
+        return (await response.read()).lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'#EXTM3U')
+
+
+async def _first_playlist(session, body, referer):
+    """Return the first m3u8 URL in body that serves a playlist, or None"""
+    candidates = []
+    for found in M3U8_RE.finditer(body):
+        candidate = _decode_m3u8_url(found.group())
+        if candidate not in candidates:
+            candidates.append(candidate)
+            if len(candidates) == MAX_CANDIDATES:
+                break
+
+    for candidate in candidates:
+        try:
+            if await _is_playlist(session, candidate, referer):
+                return candidate
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+    return None
+
+
+async def _fast_m3u8(url, session):
+    """
+    Look for the m3u8 URL in the embed HTML and, failing that, in the
+    first few scripts it references. Only a URL that actually serves a
+    playlist is returned; None means the browser has to find it.
+    """
+    try:
+        body = await _fetch_body(session, url, url)
+        if body is None:
+            return None
+
+        m3u8_url = await _first_playlist(session, body, url)
+
+        if not m3u8_url:
+            for src in SCRIPT_SRC_RE.findall(body)[:MAX_SCRIPTS]:
+                script = await _fetch_body(session, urljoin(url, html.unescape(src.decode())), url)
+                m3u8_url = script and await _first_playlist(session, script, url)
+                if m3u8_url:
+                    break
+
+        if not m3u8_url:
+            return None
+
+        return {
+            "m3u8": m3u8_url,
+            "headers": {**HEADERS, "Referer": url}
+        }
+    except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+        return None
+
+
+async def scrape_m3u8(url):
+    # Plain HTTP first; only fall back to the browser when the URL is built client-side
+    result = await _fast_m3u8(url, _get_session())
+    if result:
+        return result
+
+    # Navigation errors and timeouts are retried; a page that simply never
+    # requests an m3u8 returns {"m3u8": None} and is not
+    return await retry(
+        lambda: _scrape_m3u8_browser(url),
+        timeout=BROWSER_SCRAPE_TIMEOUT,
+        exceptions=(PlaywrightError, asyncio.TimeoutError),
+    )
+
+
+async def _scrape_m3u8_browser(url):
+    browser = await _get_browser()
+    context = await browser.new_context()
 
-        page = await browser.new_page()
+    try:
+        page = await context.new_page()
 
         loop = asyncio.get_running_loop()
         future = loop.create_future()
@@ -37,8 +190,9 @@ async def scrape_m3u8(url):
         except asyncio.TimeoutError:
             result = {"m3u8": None, "headers": None}
 
-        await browser.close()
         return result
+    finally:
+        await context.close()
 
 
 # # ---- RUN & PRINT RESULT ----
@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime
+
+import storage
+
+log = logging.getLogger(__name__)
+
+# One cached matches file per filename, shared by load_matches and save_matches
+_FILES = {}
+
+
+def parse_match_datetimes(matches):
+    """Parse each match's dateTime once and store it as match['_dt'] (None if invalid)"""
+    for match in matches:
+        try:
+            match['_dt'] = datetime.fromisoformat((match.get('dateTime') or '').replace('Z', '+00:00'))
+        except ValueError as e:
+            log.warning("⚠ Error parsing datetime: %s", e)
+            match['_dt'] = None
+
+
+def _matches_file(filename):
+    if filename not in _FILES:
+        _FILES[filename] = storage.CachedJsonFile(filename, prepare=parse_match_datetimes)
+    return _FILES[filename]
+
+
+def load_matches(filename='footystream_matches.json'):
+    """Load matches from JSON file, reusing the parsed copy if the file hasn't changed"""
+    try:
+        return _matches_file(filename).load()
+    except (FileNotFoundError, storage.JSONDecodeError):
+        log.error("❌ Could not load %s", filename)
+        return []
+
+
+def save_matches(matches, filename='footystream_matches.json'):
+    """Save matches to JSON file via a temp file so readers never see a partial write"""
+    # '_dt' is the in-memory parsed dateTime and isn't written back
+    content = [{k: v for k, v in match.items() if k != '_dt'} for match in matches]
+    _matches_file(filename).save(matches, content=content)
+
+
+def seconds_until_next_check(matches, missing_key, window, retry_interval=60, min_sleep=5, max_sleep=300):
+    """
+    Work out how long to sleep until a match still missing missing_key
+    enters its fetch window
+    
+    Args:
+        matches: List of match dicts with their parsed '_dt' datetimes
+        missing_key: Field the monitor fills in; matches that have it are skipped
+        window: (start, end) of the fetch window in seconds relative to kick-off,
+            e.g. (-600, 600) for ±10 minutes
+        retry_interval: Seconds between retries for matches already in the window
+        min_sleep: Lower bound on the result
+        max_sleep: Upper bound on the result
+        
+    Returns:
+        float: Seconds to sleep, bounded to [min_sleep, max_sleep]
+    """
+    window_start, window_end = window
+    wait = max_sleep
+    
+    for match in matches:
+        if match.get(missing_key):
+            continue
+        
+        match_time = match.get('_dt')
+        if match_time is None:
+            continue
+        
+        now = datetime.now(match_time.tzinfo) if match_time.tzinfo else datetime.now()
+        seconds_to_start = (match_time - now).total_seconds()
+        
+        if seconds_to_start < window_start:
+            continue  # Window already closed
+        elif seconds_to_start <= window_end:
+            wait = min(wait, retry_interval)  # In the window but still missing
+        else:
+            wait = min(wait, seconds_to_start - window_end)
+    
+    return max(min_sleep, min(wait, max_sleep))
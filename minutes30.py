@@ -1,112 +1,115 @@
-import json
+import sys
 import asyncio
+import logging
 from datetime import datetime, timedelta
-from get_link import get_match_links
 
+from log_config import setup_logging
+import match_times
+from get_link import create_session, get_match_links
 
-def load_matches(filename='footystream_matches.json'):
-    """Load matches from JSON file"""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"❌ Could not load {filename}")
-        return []
+log = logging.getLogger(__name__)
 
+# Upper bound on match pages fetched at the same time
+MAX_CONCURRENT_FETCHES = 10
 
-def save_matches(matches, filename='footystream_matches.json'):
-    """Save matches to JSON file"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(matches, f, indent=2, ensure_ascii=False)
+# Bounds in seconds on the monitor's sleep between passes
+MIN_SLEEP = 5
+MAX_SLEEP = 300
 
+# Fetch window in seconds relative to kick-off, the 30 minutes before it
+WINDOW = (0, 1800)
 
-def is_within_30_minutes(match_datetime_str):
+
+def is_within_30_minutes(match):
     """
     Check if match time is within 30 minutes from now
     
     Args:
-        match_datetime_str: ISO format datetime string
+        match: Match dict with its parsed '_dt' datetime (see match_times.parse_match_datetimes)
         
     Returns:
         bool: True if within 30 minutes, False otherwise
     """
-    try:
-        match_time = datetime.fromisoformat(match_datetime_str.replace('Z', '+00:00'))
-        now = datetime.now(match_time.tzinfo) if match_time.tzinfo else datetime.now()
-        
-        time_diff = match_time - now
-        
-        # Check if match is between now and 30 minutes from now
-        return timedelta(0) <= time_diff <= timedelta(minutes=30)
-        
-    except Exception as e:
-        print(f"⚠ Error parsing datetime: {e}")
+    match_time = match.get('_dt')
+    if match_time is None:
         return False
+    
+    now = datetime.now(match_time.tzinfo) if match_time.tzinfo else datetime.now()
+    time_diff = match_time - now
+    
+    # Check if match is between now and 30 minutes from now
+    return timedelta(seconds=WINDOW[0]) <= time_diff <= timedelta(seconds=WINDOW[1])
 
 
 async def update_match_links():
     """
     Check all matches and update links for those starting within 30 minutes
     """
-    print("🔍 Checking matches for link updates...")
-    print("="*70 + "\n")
+    log.info("🔍 Checking matches for link updates...")
+    log.info("=" * 70)
     
     # Load matches
-    matches = load_matches()
+    matches = match_times.load_matches()
     
     if not matches:
-        print("No matches found in file")
+        log.info("No matches found in file")
         return
     
-    print(f"Loaded {len(matches)} matches\n")
+    log.info("Loaded %d matches", len(matches))
     
-    updated_count = 0
+    eligible = []
     
     for match in matches:
-        doc_id = match.get('doc_id', 'unknown')
         title = match.get('title', 'Unknown match')
-        match_url = match.get('url', '')
-        datetime_str = match.get('dateTime', '')
         
         # Skip if already has links
         if match.get('stream_links'):
-            print(f"⏭️  {title}")
-            print(f"   Already has links - skipping\n")
+            log.debug("⏭️  %s - already has links, skipping", title)
             continue
         
         # Check if within 30 minutes
-        if not is_within_30_minutes(datetime_str):
+        if not is_within_30_minutes(match):
             continue
         
-        print(f"⏰ {title}")
-        print(f"   Match starting soon - fetching links...")
+        eligible.append(match)
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    
+    async def process(session, match):
+        async with semaphore:
+            links = await get_match_links(session, match.get('url', ''))
         
-        # Get links
-        links = get_match_links(match_url)
+        title = match.get('title', 'Unknown match')
         
         if links:
             # Update match with links
             match['stream_links'] = links
             match['links_updated_at'] = datetime.now().isoformat()
-            updated_count += 1
             
-            print(f"   ✅ Found {len(links)} stream link(s)")
+            log.info("✅ %s: found %d stream link(s)", title, len(links))
             for i, link in enumerate(links, 1):
-                print(f"      {i}. {link}")
-            print()
-        else:
-            print(f"   ⚠️  No links found yet\n")
+                log.debug("      %d. %s", i, link)
+            return True
+        
+        log.debug("⚠️  %s: no links found yet", title)
+        return False
+    
+    # Fetch the eligible match pages in parallel over one keep-alive session
+    async with create_session() as session:
+        results = await asyncio.gather(*[process(session, match) for match in eligible])
+    
+    updated_count = sum(results)
     
     # Save updated matches
     if updated_count > 0:
-        save_matches(matches)
-        print(f"{'='*70}")
-        print(f"✅ Updated {updated_count} match(es) with stream links")
-        print(f"{'='*70}")
+        match_times.save_matches(matches)
+        log.info("=" * 70)
+        log.info("✅ Updated %d match(es) with stream links", updated_count)
+        log.info("=" * 70)
     else:
-        print(f"{'='*70}")
-        print(f"ℹ️  No matches needed updating")
-        print(f"{'='*70}")
+        log.info("=" * 70)
+        log.info("ℹ️  No matches needed updating")
+        log.info("=" * 70)
 
 
 async def monitor_and_update(check_interval=60):
@@ -114,21 +117,28 @@ async def monitor_and_update(check_interval=60):
     Continuously monitor matches and update links
     
     Args:
-        check_interval: Time in seconds between checks (default: 1 minutes)
+        check_interval: Seconds between retries for matches already in the window (default: 1 minute)
+    
+    Between passes the loop sleeps until the next pending match enters the
+    window, bounded to [MIN_SLEEP, MAX_SLEEP] so new matches are still picked up.
     """
     print("🚀 Starting FootyStream Link Updater...")
-    print(f"⏱️  Check interval: {check_interval} seconds ({check_interval // 60} minutes)")
+    print(f"⏱️  Retry interval: {check_interval} seconds, idle wake-up at most every {MAX_SLEEP} seconds")
     print(f"{'='*70}\n")
     
     while True:
         try:
             await update_match_links()
             
-            next_check = datetime.now() + timedelta(seconds=check_interval)
+            sleep_for = match_times.seconds_until_next_check(
+                match_times.load_matches(), 'stream_links', WINDOW, check_interval, MIN_SLEEP, MAX_SLEEP
+            )
+            
+            next_check = datetime.now() + timedelta(seconds=sleep_for)
             print(f"\n⏳ Next check at: {next_check.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"💤 Sleeping for {check_interval // 60} minutes...\n")
+            print(f"💤 Sleeping for {int(sleep_for)} seconds...\n")
             
-            await asyncio.sleep(check_interval)
+            await asyncio.sleep(sleep_for)
             
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -139,7 +149,7 @@ async def monitor_and_update(check_interval=60):
 
 async def main_30minutes():
     """Main entry point"""
-    import sys
+    setup_logging()
     
     if len(sys.argv) > 1 and sys.argv[1] == '--once':
         # Run once mode
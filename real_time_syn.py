@@ -1,23 +1,137 @@
-import json
+import os
+import sys
+import mmap
+import asyncio
+import logging
 import time
-import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import Aborted, DeadlineExceeded, ServiceUnavailable
+from log_config import setup_logging
+import storage
+import xxhash
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Fall back to polling
+    FileSystemEventHandler = object
+    Observer = None
+
+log = logging.getLogger(__name__)
+
+# Sidecar file holding the per-document content hashes between runs
+STATE_FILE = '.sync_state.json'
+
+# Quiet period after the last file event before a sync starts
+DEBOUNCE_SECONDS = 0.2
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+# Attempts per batch commit before its writes are counted as errors
+COMMIT_ATTEMPTS = 5
+RETRYABLE_COMMIT_ERRORS = (Aborted, DeadlineExceeded, ServiceUnavailable)
+
+# Batch commits in flight at once, and Firestore's sustained write limit
+COMMIT_WORKERS = 10
+MAX_WRITES_PER_SECOND = 10000
+
+
+class TokenBucket:
+    """Blocking rate limiter that refills `rate` tokens per second"""
+    
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def take(self, count):
+        """Block until `count` tokens are available, then consume them"""
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                
+                time.sleep((count - self.tokens) / self.rate)
+
+
+class JsonFileEventHandler(FileSystemEventHandler):
+    """Queue a sync whenever the watched file is written, created or renamed into place"""
+    
+    EVENT_TYPES = ('modified', 'created', 'moved', 'closed')
+    
+    def __init__(self, path, notify, debounce=DEBOUNCE_SECONDS):
+        """
+        Args:
+            path: Absolute path of the file to watch
+            notify: Called (from a timer thread) with the event type once per burst of relevant events
+            debounce: Quiet period in seconds before a burst is reported
+        """
+        super().__init__()
+        self.path = path
+        self.notify = notify
+        self.debounce = debounce
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in self.EVENT_TYPES:
+            return
+        
+        # Events arrive for the whole directory; keep only those for our file
+        if self.path in (event.src_path, getattr(event, 'dest_path', None)):
+            # One save fires several events (write, close, rename); restart the
+            # timer on each so only the last one queues a sync
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.debounce, self.notify, args=(event.event_type,))
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def cancel(self):
+        """Drop a pending notification, e.g. once the event loop it would wake is shutting down"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
 
 
 class RealtimeFirestoreSync:
-    def __init__(self, service_account_path='serviceAccountKey.json', collection_name='matches'):
+    def __init__(self, service_account_path='serviceAccountKey.json', collection_name='matches',
+                 json_file='footystream_matches.json', reconcile=False):
         """
         Initialize Firestore connection with real-time sync capabilities
         
         Args:
             service_account_path: Path to Firebase service account JSON
             collection_name: Firestore collection name
+            json_file: Path of the matches JSON file to watch
+            reconcile: Rebuild the content hash map from Firestore even if a state file exists
         """
         self.collection_name = collection_name
-        self.json_file = 'footystream_matches.json'
+        self.json_file = json_file
         self.last_hash = None
+        self._last_stat = None
+        # Parsed JSON file, re-read only when it changes on disk
+        self._json = storage.CachedJsonFile(self.json_file)
+        
+        # Content hash of every document as last written, keyed by doc_id, and
+        # the file hash of the last JSON file that synced without errors
+        self.state_file = STATE_FILE
+        state = self.load_state()
+        self.doc_hashes = (state or {}).get('doc_hashes', {})
+        self.last_synced_hash = (state or {}).get('last_synced_hash')
         
         # Initialize Firebase Admin SDK
         if not firebase_admin._apps:
@@ -27,33 +141,56 @@ class RealtimeFirestoreSync:
         self.db = firestore.client()
         self.collection = self.db.collection(collection_name)
         
+        # Batches are committed in parallel, within Firestore's write quota
+        self.commit_pool = ThreadPoolExecutor(max_workers=COMMIT_WORKERS)
+        self.write_limiter = TokenBucket(MAX_WRITES_PER_SECOND)
+        
         print(f"✅ Connected to Firestore")
         print(f"📁 Collection: {collection_name}")
         print(f"📄 Watching file: {self.json_file}")
+        
+        # Without a state file every stored document would look new and be
+        # overwritten instead of merged, so read the hashes from Firestore first
+        if reconcile or state is None:
+            self.reconcile()
     
     def load_json_data(self):
-        """Load matches from JSON file"""
+        """Load matches from JSON file, reusing the parsed copy if the file hasn't changed"""
         try:
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self._json.load()
         except FileNotFoundError:
-            print(f"❌ File {self.json_file} not found!")
+            log.error("❌ File %s not found!", self.json_file)
             return []
-        except json.JSONDecodeError:
-            print(f"❌ Error reading {self.json_file}!")
+        except storage.JSONDecodeError:
+            log.error("❌ Error reading %s!", self.json_file)
             return []
     
     def get_file_hash(self):
         """Calculate hash of JSON file to detect changes"""
         try:
             with open(self.json_file, 'rb') as f:
-                file_content = f.read()
-                return hashlib.md5(file_content).hexdigest()
+                if os.fstat(f.fileno()).st_size == 0:
+                    return xxhash.xxh3_64(b'').hexdigest()
+                # Hash straight from the page cache instead of copying the file into memory
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return xxhash.xxh3_64(mapped).hexdigest()
         except FileNotFoundError:
             return None
     
     def has_file_changed(self):
         """Check if JSON file has changed since last check"""
+        # Unchanged mtime and size: skip reading the file at all
+        try:
+            st = os.stat(self.json_file)
+        except FileNotFoundError:
+            return False
+        
+        current_stat = (st.st_mtime_ns, st.st_size)
+        if current_stat == self._last_stat:
+            return False
+        self._last_stat = current_stat
+        
+        # Stat changed (e.g. file touched or rewritten): compare contents
         current_hash = self.get_file_hash()
         
         if current_hash is None:
@@ -70,35 +207,51 @@ class RealtimeFirestoreSync:
         return False
     
     def get_all_firestore_docs(self):
-        """Get all document IDs from Firestore"""
-        docs = self.collection.stream()
-        return {doc.id: doc.to_dict() for doc in docs}
+        """Get every document ID in Firestore with its stored content hash (None if missing)"""
+        # Only the hash field is read, not the whole document
+        docs = self.collection.select(['content_hash']).stream()
+        return {doc.id: (doc.to_dict() or {}).get('content_hash') for doc in docs}
     
-    def has_changes(self, local_data, firestore_data):
-        """Compare local data with Firestore data to detect changes"""
-        if not firestore_data:
-            return True  # New document
-        
-        for key, value in local_data.items():
-            if key in ['syncedAt', 'lastCheckedAt']:
-                continue
-            if value != firestore_data.get(key):
-                return True
-        
-        return False
+    def load_state(self):
+        """Load the sync state (doc hashes, last synced file hash) written after earlier syncs, or None if there is none"""
+        try:
+            return storage.load(self.state_file)
+        except (FileNotFoundError, storage.JSONDecodeError):
+            return None
+    
+    def save_state(self):
+        """Persist the sync state so a restart doesn't re-sync everything"""
+        storage.save({
+            'doc_hashes': self.doc_hashes,
+            'last_synced_hash': self.last_synced_hash
+        }, self.state_file)
+    
+    def reconcile(self):
+        """Rebuild the content hash map from the documents actually stored in Firestore"""
+        print(f"🔁 Reconciling with Firestore collection: {self.collection_name}...")
+        # Documents written before content_hash existed map to None and get re-synced once
+        self.doc_hashes = self.get_all_firestore_docs()
+        # Firestore may differ from the last synced file, so don't skip the next sync
+        self.last_synced_hash = None
+        self.save_state()
+        print(f"✓ {len(self.doc_hashes)} document(s) known in Firestore")
     
     def sync_to_firestore(self):
         """Sync JSON data to Firestore"""
+        # Nothing to do if this exact file already synced without errors.
+        # Hash before loading: if the file changes in between, the stale hash just forces another sync
+        file_hash = self.get_file_hash()
+        if file_hash is not None and file_hash == self.last_synced_hash:
+            log.info("✓ File unchanged since the last successful sync - skipping")
+            return {'added': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        
         # Load local JSON data
         matches = self.load_json_data()
         
         if not matches:
-            print("⚠️  No matches found in JSON file")
+            log.warning("⚠️  No matches found in JSON file")
             return {'added': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
         
-        # Get all existing Firestore documents
-        firestore_docs = self.get_all_firestore_docs()
-        
         # Track statistics
         stats = {
             'added': 0,
@@ -107,7 +260,8 @@ class RealtimeFirestoreSync:
             'errors': 0
         }
         
-        # Process each match
+        # First pass: keep only matches whose content differs from what was last written
+        changed = []  # (match, doc_id, content hash)
         for match in matches:
             doc_id = match.get('doc_id')
             
@@ -116,111 +270,197 @@ class RealtimeFirestoreSync:
                 continue
             
             try:
-                # Get existing Firestore data
-                existing_data = firestore_docs.get(doc_id)
-                
+                match_hash = storage.content_hash(match)
+            except Exception as e:
+                log.error("  ❌ ERROR syncing %s: %s", doc_id, e)
+                stats['errors'] += 1
+                continue
+            
+            if match_hash == self.doc_hashes.get(doc_id):
+                stats['unchanged'] += 1
+            else:
+                changed.append((match, doc_id, match_hash))
+        
+        # Writes are staged in a WriteBatch and committed MAX_BATCH_WRITES at a time
+        batch = self.db.batch() if changed else None
+        staged = []  # (kind, doc_id, content hash) for each write in the current batch
+        pending = []  # (future, staged) for every batch handed to the commit pool
+        synced_at = datetime.now().isoformat()  # one timestamp for the whole sync
+        
+        # Second pass: stage a write for each changed match
+        for match, doc_id, match_hash in changed:
+            try:
                 # Prepare data for Firestore
                 sync_data = match.copy()
-                sync_data['syncedAt'] = datetime.now().isoformat()
+                sync_data['syncedAt'] = synced_at
+                sync_data['content_hash'] = match_hash
                 
-                # Check if document needs updating
-                if self.has_changes(match, existing_data):
-                    if existing_data:
-                        # Update existing document
-                        stats['updated'] += 1
-                        print(f"  🔄 Updated: {match.get('title', 'Unknown')}")
-                        self.collection.document(doc_id).set(sync_data, merge=True)
-                    else:
-                        # Add new document
-                        stats['added'] += 1
-                        print(f"  ➕ Added: {match.get('title', 'Unknown')}")
-                        self.collection.document(doc_id).set(sync_data)
+                if doc_id in self.doc_hashes:
+                    # Update existing document
+                    log.debug("  🔄 Updated: %s", match.get('title', 'Unknown'))
+                    batch.set(self.collection.document(doc_id), sync_data, merge=True)
+                    staged.append(('updated', doc_id, match_hash))
                 else:
-                    stats['unchanged'] += 1
+                    # Add new document
+                    log.debug("  ➕ Added: %s", match.get('title', 'Unknown'))
+                    batch.set(self.collection.document(doc_id), sync_data)
+                    staged.append(('added', doc_id, match_hash))
                 
             except Exception as e:
-                print(f"  ❌ ERROR syncing {doc_id}: {e}")
+                log.error("  ❌ ERROR syncing %s: %s", doc_id, e)
                 stats['errors'] += 1
+            
+            if len(staged) == MAX_BATCH_WRITES:
+                pending.append(self.submit_batch(batch, staged))
+                batch = self.db.batch()
+                staged = []
+        
+        if staged:
+            pending.append(self.submit_batch(batch, staged))
+        
+        # Wait for every batch; only committed writes update the hash map
+        for future, writes in pending:
+            try:
+                future.result()
+                for kind, doc_id, match_hash in writes:
+                    stats[kind] += 1
+                    self.doc_hashes[doc_id] = match_hash
+            except Exception as e:
+                log.error("  ❌ ERROR committing batch of %d write(s): %s", len(writes), e)
+                stats['errors'] += len(writes)
+        
+        previous_hash = self.last_synced_hash
+        stale = []
+        if stats['errors'] == 0:
+            self.last_synced_hash = file_hash
+            # Forget matches that dropped out of the file, or the state grows with every day's scrape
+            current_ids = {match.get('doc_id') for match in matches}
+            stale = [doc_id for doc_id in self.doc_hashes if doc_id not in current_ids]
+            for doc_id in stale:
+                del self.doc_hashes[doc_id]
+        
+        if stats['added'] or stats['updated'] or stale or self.last_synced_hash != previous_hash:
+            self.save_state()
         
         return stats
     
-    def watch_and_sync(self, check_interval=60):
+    def commit_batch(self, batch):
+        """Commit a WriteBatch, retrying aborted or timed-out commits with exponential backoff"""
+        for attempt in range(COMMIT_ATTEMPTS):
+            try:
+                return batch.commit()
+            except RETRYABLE_COMMIT_ERRORS:
+                if attempt == COMMIT_ATTEMPTS - 1:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+    
+    def submit_batch(self, batch, staged):
+        """Hand a batch to the commit pool once the write quota allows it"""
+        self.write_limiter.take(len(staged))
+        return self.commit_pool.submit(self.commit_batch, batch), staged
+    
+    def print_sync_summary(self, stats):
+        """Log the result of one sync_to_firestore call as a single summary line"""
+        if stats['added'] > 0 or stats['updated'] > 0:
+            log.info("✅ Sync completed: ➕ %d added, 🔄 %d updated, ✓ %d unchanged, ❌ %d errors",
+                     stats['added'], stats['updated'], stats['unchanged'], stats['errors'])
+        elif stats['errors'] > 0:
+            log.warning("❌ Sync finished with %d error(s)", stats['errors'])
+        else:
+            log.info("✓ No changes needed (all up to date)")
+    
+    async def watch_and_sync(self, check_interval=60, poll=False):
         """
         Continuously watch JSON file and sync changes to Firestore
         
+        Uses file-system notifications (watchdog) so the loop sleeps until the
+        file is actually written, and falls back to polling has_file_changed
+        when watchdog is not installed or poll=True. Each sync runs in a worker
+        thread, so other tasks on the same event loop (e.g. the m3u8 refresh
+        monitor) keep running while Firestore commits are in flight.
+        
         Args:
-            check_interval: Seconds between checks (default: 60)
+            check_interval: Seconds between checks when polling (default: 60)
+            poll: Force polling even if watchdog is available
         """
         print("\n" + "="*70)
         print("🔄 REAL-TIME FIRESTORE SYNC STARTED")
         print("="*70)
-        print(f"⏱️  Check interval: {check_interval} seconds")
         print(f"👀 Watching for changes in: {self.json_file}")
         print(f"🔥 Syncing to Firestore collection: {self.collection_name}")
         print("="*70 + "\n")
         
-        iteration = 0
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        observer = None
         
-        while True:
-            try:
-                iteration += 1
-                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-                print(f"🔍 Check #{iteration} - {current_time}")
+        if poll or Observer is None:
+            if not poll:
+                print("⚠️  watchdog is not installed - falling back to polling")
+            print(f"⏱️  Check interval: {check_interval} seconds\n")
+        else:
+            # Timer threads can't touch the Event directly; hand the wake-up to the loop
+            path = os.path.abspath(self.json_file)
+            notify = lambda event_type: loop.call_soon_threadsafe(changed.set)
+            handler = JsonFileEventHandler(path, notify)
+            observer = Observer()
+            observer.schedule(handler, os.path.dirname(path), recursive=False)
+            observer.start()
+        
+        # Sync whatever is on disk at startup
+        changed.set()
+        
+        try:
+            while True:
+                if observer is None:
+                    try:
+                        await asyncio.wait_for(changed.wait(), check_interval)
+                    except asyncio.TimeoutError:
+                        if not await asyncio.to_thread(self.has_file_changed):
+                            continue
+                else:
+                    await changed.wait()
+                # Events that arrive during the sync set it again and trigger one more pass
+                changed.clear()
                 
-                # Check if file has changed
-                if self.has_file_changed():
-                    print(f"📝 Changes detected in {self.json_file}!")
+                try:
+                    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    print(f"📝 Changes detected in {self.json_file} - {current_time}")
                     print(f"🔄 Syncing to Firestore...")
                     
-                    stats = self.sync_to_firestore()
-                    
-                    # Print summary
-                    if stats['added'] > 0 or stats['updated'] > 0:
-                        print(f"\n✅ Sync completed:")
-                        if stats['added'] > 0:
-                            print(f"   ➕ Added: {stats['added']}")
-                        if stats['updated'] > 0:
-                            print(f"   🔄 Updated: {stats['updated']}")
-                        if stats['errors'] > 0:
-                            print(f"   ❌ Errors: {stats['errors']}")
-                    else:
-                        print(f"✓ No changes needed (all up to date)")
-                else:
-                    print(f"✓ No file changes detected")
-                
-                # Wait for next check
-                next_check = datetime.now()
-                next_check = next_check.replace(second=0, microsecond=0)
-                # Add check_interval seconds
-                import datetime as dt
-                next_check = next_check + dt.timedelta(seconds=check_interval)
-                print(f"⏳ Next check at: {next_check.strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"💤 Sleeping for {check_interval} seconds...\n")
-                
-                time.sleep(check_interval)
-                
-            except KeyboardInterrupt:
-                print("\n\n👋 Real-time sync stopped by user")
-                break
-            except Exception as e:
-                print(f"\n❌ Error: {e}")
-                import traceback
-                traceback.print_exc()
-                print(f"\n⏳ Continuing in {check_interval} seconds...\n")
-                time.sleep(check_interval)
+                    self.print_sync_summary(await asyncio.to_thread(self.sync_to_firestore))
+                    print()
+                except Exception as e:
+                    print(f"\n❌ Error: {e}")
+                    import traceback
+                    traceback.print_exc()
+        finally:
+            if observer is not None:
+                observer.stop()
+                await asyncio.to_thread(observer.join)
+                # No events arrive once the observer has stopped; a debounce timer
+                # still pending would call into the loop after it has closed
+                handler.cancel()
 
 
 def main():
     """Main entry point"""
-    import sys
+    setup_logging()
+    
+    args = sys.argv[1:]
+    
+    # --poll forces the interval-based loop instead of file-system events
+    poll = '--poll' in args
+    # --reconcile rebuilds the content hash map from Firestore before syncing
+    reconcile = '--reconcile' in args
+    args = [arg for arg in args if arg not in ('--poll', '--reconcile')]
     
     # Parse command line arguments
     check_interval = 60  # Default: 60 seconds
     
-    if len(sys.argv) > 1:
+    if args:
         try:
-            check_interval = int(sys.argv[1])
+            check_interval = int(args[0])
             if check_interval < 1:
                 print("⚠️  Check interval must be at least 1 second. Using 60 seconds.")
                 check_interval = 60
@@ -228,14 +468,17 @@ def main():
             print("⚠️  Invalid interval. Using default: 60 seconds")
     
     # Create sync instance
-    sync = RealtimeFirestoreSync(
-        service_account_path='serviceAccountKey.json',
-        collection_name='matches'
-    )
-    
     try:
+        sync = RealtimeFirestoreSync(
+            service_account_path='serviceAccountKey.json',
+            collection_name='matches',
+            reconcile=reconcile
+        )
+        
         # Start watching and syncing
-        sync.watch_and_sync(check_interval=check_interval)
+        asyncio.run(sync.watch_and_sync(check_interval=check_interval, poll=poll))
+    except KeyboardInterrupt:
+        print("\n\n👋 Real-time sync stopped by user")
     except Exception as e:
         print(f"\n❌ Fatal error: {e}")
         import traceback
@@ -245,13 +488,19 @@ def main():
 if __name__ == "__main__":
     """
     Usage:
-        # Watch and sync every 60 seconds (default)
+        # Sync whenever the file changes (file-system events via watchdog)
         python realtime_sync.py
         
-        # Watch and sync every 30 seconds
-        python realtime_sync.py 30
+        # Poll every 60 seconds instead (default interval)
+        python realtime_sync.py --poll
+        
+        # Poll every 30 seconds
+        python realtime_sync.py 30 --poll
+        
+        # Poll every 2 minutes (120 seconds)
+        python realtime_sync.py 120 --poll
         
-        # Watch and sync every 2 minutes (120 seconds)
-        python realtime_sync.py 120
+        # Re-read Firestore first, e.g. after documents were edited elsewhere
+        python realtime_sync.py --reconcile
     """
     main()
\ No newline at end of file
@@ -1,12 +1,22 @@
+import re
+import sys
 import asyncio
-import json
-import time
-from urllib.parse import urlparse, parse_qs
+import logging
 from datetime import datetime, timedelta
-from m3u8 import scrape_m3u8
+from log_config import setup_logging
+from m3u8 import scrape_m3u8, shutdown
+import storage
+
+log = logging.getLogger(__name__)
 
 MATCHES_FILE = 'footystream_matches.json'
 
+# 'expires' query parameter of a signed m3u8 URL
+_EXPIRES_RE = re.compile(r'[?&]expires=(\d+)(?:&|$)')
+
+# How many expiring URLs are re-scraped at the same time
+MAX_CONCURRENT_REFRESHES = 10
+
 class MatchesMonitor:
     def __init__(self, matches_file=MATCHES_FILE):
         """
@@ -17,25 +27,34 @@ class MatchesMonitor:
         """
         self.matches_file = matches_file
         self.data = None
+        # Parsed matches file, re-read only when it changes on disk
+        self._file = storage.CachedJsonFile(matches_file)
+        # Bounds concurrent scrapes when refreshing expiring URLs
+        self.semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_REFRESHES)
         
     def load_matches(self):
-        """Load matches from JSON file"""
+        """Load matches from JSON file, reusing the parsed copy if the file hasn't changed"""
         try:
-            with open(self.matches_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+            self.data = self._file.load()
             return True
         except FileNotFoundError:
-            print(f"❌ File {self.matches_file} not found!")
+            log.error("❌ File %s not found!", self.matches_file)
             return False
-        except json.JSONDecodeError:
-            print(f"❌ Error reading {self.matches_file}!")
+        except storage.JSONDecodeError:
+            log.error("❌ Error reading %s!", self.matches_file)
             return False
     
-    def save_matches(self):
-        """Save matches to JSON file"""
-        with open(self.matches_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
-        print(f"✅ Saved updates to {self.matches_file}")
+    async def save_matches(self):
+        """Save matches to JSON file without blocking the event loop"""
+        await asyncio.to_thread(self._save_matches_sync)
+    
+    def _save_matches_sync(self):
+        """Save matches to JSON file via a temp file so readers never see a partial write"""
+        # No fsync: the file is rebuilt by the scrapers anyway, only torn writes matter
+        # A failed save drops the cached copy, so refreshed URLs that never
+        # reached disk are refreshed again on the next pass
+        self._file.save(self.data, fsync=False)
+        log.info("✅ Saved updates to %s", self.matches_file)
     
     def get_m3u8_url_string(self, m3u8_data):
         """
@@ -76,48 +95,18 @@ class MatchesMonitor:
         if not m3u8_url_string or not isinstance(m3u8_url_string, str):
             return None
             
-        parsed = urlparse(m3u8_url_string)
-        params = parse_qs(parsed.query)
-        
         # Only process URLs with 'expires' parameter
-        if 'expires' in params:
-            try:
-                return int(params['expires'][0])
-            except (ValueError, IndexError):
-                return None
-        
-        return None
+        match = _EXPIRES_RE.search(m3u8_url_string)
+        return int(match.group(1)) if match else None
     
-    def is_expiring_soon(self, m3u8_url_string, minutes=5):
-        """
-        Check if the m3u8 URL will expire within the specified minutes.
-        
-        Args:
-            m3u8_url_string (str): The m3u8 URL string to check
-            minutes (int): Minutes before expiry to trigger refresh
-            
-        Returns:
-            bool: True if expiring within specified minutes or already expired
-        """
-        expiry_timestamp = self.get_expiry_timestamp(m3u8_url_string)
-        if not expiry_timestamp:
-            return False
-        
-        current_time = int(time.time())
-        time_until_expiry = expiry_timestamp - current_time
-        
-        # Convert minutes to seconds
-        threshold_seconds = minutes * 60
-        
-        # Check if within threshold or already expired
-        return time_until_expiry <= threshold_seconds
-    
-    async def refresh_match_m3u8(self, match):
+    async def refresh_match_m3u8(self, match, report, updated_at=None):
         """
         Fetch a new m3u8 URL from the working embed URL and update the match.
         
         Args:
             match (dict): Match document
+            report (list): Output lines for this match, printed once all refreshes finish
+            updated_at (str): ISO timestamp to record; defaults to now
             
         Returns:
             bool: True if successfully refreshed
@@ -125,36 +114,37 @@ class MatchesMonitor:
         working_embed_url = match.get('working_embed_url')
         
         if not working_embed_url:
-            print(f"   ⚠️  No working_embed_url found for this match")
+            report.append(f"   ⚠️  No working_embed_url found for this match")
             return False
         
-        print(f"   🔄 Refreshing m3u8 URL from: {working_embed_url[:60]}...")
+        report.append(f"   🔄 Refreshing m3u8 URL from: {working_embed_url[:60]}...")
         
         try:
             # Call the scrape_m3u8 function from m3u8.py
-            result = await scrape_m3u8(working_embed_url)
+            async with self.semaphore:
+                result = await scrape_m3u8(working_embed_url)
             
             # Update the match with new values
             if result:
                 match['m3u8_url'] = result
-                match['m3u8_updated_at'] = datetime.now().isoformat()
+                match['m3u8_updated_at'] = updated_at or datetime.now().isoformat()
                 
                 # Show what was updated
                 if isinstance(result, dict):
                     if 'm3u8' in result:
-                        print(f"   ✅ Updated m3u8 URL")
+                        report.append(f"   ✅ Updated m3u8 URL")
                     if 'headers' in result:
-                        print(f"   ✅ Updated headers")
+                        report.append(f"   ✅ Updated headers")
                 else:
-                    print(f"   ✅ Updated m3u8 URL")
+                    report.append(f"   ✅ Updated m3u8 URL")
                 
                 return True
             else:
-                print(f"   ❌ Failed to get new m3u8 URL")
+                report.append(f"   ❌ Failed to get new m3u8 URL")
                 return False
                 
         except Exception as e:
-            print(f"   ❌ Error refreshing URL: {e}")
+            report.append(f"   ❌ Error refreshing URL: {e}")
             return False
     
     async def check_and_refresh_matches(self, expiry_threshold_minutes=5):
@@ -173,13 +163,23 @@ class MatchesMonitor:
         else:
             matches = self.data.get('matches', [])
         
-        refreshed_count = 0
         checked_count = 0
+        # (match, report lines) for every URL that needs refreshing
+        expiring = []
+        
+        # One clock reading for the whole pass, so every match is judged against the same instant
+        current_datetime = datetime.now()
+        current_time = int(current_datetime.timestamp())
+        threshold_seconds = expiry_threshold_minutes * 60
+        current_time_str = current_datetime.strftime('%Y-%m-%d %H:%M:%S')
+        updated_at = current_datetime.isoformat()
+        # Per-match detail for URLs that stay valid is only built when DEBUG is on
+        debug = log.isEnabledFor(logging.DEBUG)
         
-        print(f"\n{'='*70}")
-        print(f"Checking {len(matches)} matches for expiring m3u8 URLs...")
-        print(f"Expiry threshold: ≤{expiry_threshold_minutes} minutes")
-        print(f"{'='*70}\n")
+        log.info("\n%s", '=' * 70)
+        log.info("Checking %d matches for expiring m3u8 URLs...", len(matches))
+        log.info("Expiry threshold: ≤%d minutes", expiry_threshold_minutes)
+        log.info("%s\n", '=' * 70)
         
         for match in matches:
             m3u8_data = match.get('m3u8_url')
@@ -202,50 +202,62 @@ class MatchesMonitor:
             # Skip token-based URLs or URLs without expiry
             if expiry_timestamp is None:
                 if 'token=' in m3u8_url_string:
-                    print(f"ℹ️  {title}")
-                    print(f"   Token-based URL - skipping expiry check\n")
+                    log.debug("ℹ️  %s\n   Token-based URL - skipping expiry check\n", title)
                 continue
             
             # Check if expiring soon
-            current_time = int(time.time())
             time_until_expiry = expiry_timestamp - current_time
+            if time_until_expiry > threshold_seconds and not debug:
+                continue
+            
             expiry_datetime = datetime.fromtimestamp(expiry_timestamp)
             
-            print(f"📺 {title}")
-            print(f"   Doc ID: {doc_id}")
-            print(f"   Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"   URL expires at: {expiry_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
+            report = [
+                f"📺 {title}",
+                f"   Doc ID: {doc_id}",
+                f"   Current time: {current_time_str}",
+                f"   URL expires at: {expiry_datetime.strftime('%Y-%m-%d %H:%M:%S')}",
+            ]
             
             if time_until_expiry > 0:
                 minutes_left = time_until_expiry // 60
                 seconds_left = time_until_expiry % 60
-                print(f"   Time until expiry: {minutes_left} min, {seconds_left} sec")
+                report.append(f"   Time until expiry: {minutes_left} min, {seconds_left} sec")
             else:
                 minutes_ago = abs(time_until_expiry) // 60
                 seconds_ago = abs(time_until_expiry) % 60
-                print(f"   ⚠️  Expired {minutes_ago} min, {seconds_ago} sec ago")
+                report.append(f"   ⚠️  Expired {minutes_ago} min, {seconds_ago} sec ago")
             
-            if self.is_expiring_soon(m3u8_url_string, expiry_threshold_minutes):
+            if time_until_expiry <= threshold_seconds:
                 if time_until_expiry > 0:
-                    print(f"   ⏰ URL expiring soon! Refreshing...")
+                    report.append(f"   ⏰ URL expiring soon! Refreshing...")
                 else:
-                    print(f"   ⏰ URL already expired! Refreshing...")
-                    
-                if await self.refresh_match_m3u8(match):
-                    refreshed_count += 1
-                print()
+                    report.append(f"   ⏰ URL already expired! Refreshing...")
+                expiring.append((match, report))
             else:
-                print(f"   ✓ URL still valid (not expiring within {expiry_threshold_minutes} minutes)\n")
+                report.append(f"   ✓ URL still valid (not expiring within {expiry_threshold_minutes} minutes)\n")
+                log.debug("\n".join(report))
+        
+        # Refresh every expiring URL concurrently, then log each match's output in order
+        results = await asyncio.gather(
+            *(self.refresh_match_m3u8(match, report, updated_at) for match, report in expiring),
+            return_exceptions=True
+        )
+        for (match, report), result in zip(expiring, results):
+            if isinstance(result, BaseException):
+                report.append(f"   ❌ Error refreshing URL: {result}")
+            log.info("\n".join(report) + "\n")
+        refreshed_count = sum(result is True for result in results)
         
         # Save if any matches were refreshed
         if refreshed_count > 0:
-            self.save_matches()
+            await self.save_matches()
         
-        print(f"{'='*70}")
-        print(f"📊 Summary:")
-        print(f"   Matches checked: {checked_count}")
-        print(f"   M3U8 URLs refreshed: {refreshed_count}")
-        print(f"{'='*70}\n")
+        log.info("%s", '=' * 70)
+        log.info("📊 Summary:")
+        log.info("   Matches checked: %d", checked_count)
+        log.info("   M3U8 URLs refreshed: %d", refreshed_count)
+        log.info("%s\n", '=' * 70)
     
     async def monitor(self, check_interval=60, expiry_threshold_minutes=5):
         """
@@ -286,41 +298,52 @@ class MatchesMonitor:
             await asyncio.sleep(check_interval)
 
 
-async def main():
-    """
-    Main entry point
+def parse_intervals(args):
     """
-    import sys
+    Parse the [check_interval] [expiry_threshold] command line arguments
     
-    # Parse command line arguments
+    Args:
+        args: Positional arguments, flags removed; '--once' may stand in for check_interval
+        
+    Returns:
+        tuple: (check_interval in seconds, expiry_threshold in minutes), defaults for missing or invalid values
+    """
     check_interval = 60  # Default: check every 60 seconds
     expiry_threshold = 5  # Default: refresh 5 minutes before expiry
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--once':
-            # Run once mode
-            if len(sys.argv) > 2:
-                try:
-                    expiry_threshold = int(sys.argv[2])
-                except ValueError:
-                    print("Invalid expiry_threshold. Using default: 5 minutes")
-            
-            print(f"Running in single-run mode (threshold: ≤{expiry_threshold} minutes)...\n")
-            monitor = MatchesMonitor(MATCHES_FILE)
-            await monitor.check_and_refresh_matches(expiry_threshold)
-            return
-        else:
-            try:
-                check_interval = int(sys.argv[1])
-            except ValueError:
-                print("Invalid check_interval. Using default: 60 seconds")
+    if len(args) > 0 and args[0] != '--once':
+        try:
+            check_interval = int(args[0])
+        except ValueError:
+            print("Invalid check_interval. Using default: 60 seconds")
     
-    if len(sys.argv) > 2:
+    if len(args) > 1:
         try:
-            expiry_threshold = int(sys.argv[2])
+            expiry_threshold = int(args[1])
         except ValueError:
             print("Invalid expiry_threshold. Using default: 5 minutes")
     
+    return check_interval, expiry_threshold
+
+
+async def main():
+    """
+    Main entry point
+    """
+    setup_logging()
+    
+    check_interval, expiry_threshold = parse_intervals(sys.argv[1:])
+    
+    if len(sys.argv) > 1 and sys.argv[1] == '--once':
+        # Run once mode
+        print(f"Running in single-run mode (threshold: ≤{expiry_threshold} minutes)...\n")
+        monitor = MatchesMonitor(MATCHES_FILE)
+        try:
+            await monitor.check_and_refresh_matches(expiry_threshold)
+        finally:
+            await shutdown()
+        return
+    
     # Create monitor instance
     monitor = MatchesMonitor(MATCHES_FILE)
     
@@ -332,6 +355,9 @@ async def main():
         print(f"\n❌ Fatal error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # Close the shared scraper browser
+        await shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import asyncio
+
+import aiohttp
+
+# Longest pause between two attempts, in seconds
+MAX_BACKOFF = 30
+
+
+async def retry(coro_fn, tries=3, base=1.0, timeout=None, exceptions=(aiohttp.ClientError, asyncio.TimeoutError)):
+    """
+    Await coro_fn() and retry it on transient errors with exponential backoff
+
+    Args:
+        coro_fn: Zero-argument callable returning a fresh coroutine per attempt
+        tries: Total number of attempts
+        base: Backoff before the second attempt, doubled after each failure
+        timeout: Optional per-attempt timeout in seconds
+        exceptions: Exception types that are worth retrying
+
+    Returns:
+        The result of the first successful attempt; the last error is
+        re-raised once all attempts have failed
+    """
+    for attempt in range(tries):
+        try:
+            if timeout is None:
+                return await coro_fn()
+            return await asyncio.wait_for(coro_fn(), timeout)
+        except exceptions:
+            if attempt == tries - 1:
+                raise
+            await asyncio.sleep(min(base * 2 ** attempt, MAX_BACKOFF))
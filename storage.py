@@ -0,0 +1,151 @@
+import os
+import mmap
+import hashlib
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # fall back to the slower stdlib encoder/decoder
+    import json
+    orjson = None
+
+# Raised by loads() and load() on malformed JSON (a subclass of ValueError)
+JSONDecodeError = orjson.JSONDecodeError if orjson else json.JSONDecodeError
+
+# Fields left out of content_hash: timestamps that move on every scrape or sync, and
+# the hash itself. Both Firestore syncs use this one list to decide what counts as a change
+UNHASHED_FIELDS = ('scrapedAt', 'syncedAt', 'lastCheckedAt', 'content_hash')
+
+# Attempts at renaming the temp file over the destination; on Windows the rename
+# fails while another process has the destination open, which is usually brief
+REPLACE_ATTEMPTS = 5
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def dumps(obj):
+    """Serialize to UTF-8 JSON bytes, indented like json.dump(indent=2, ensure_ascii=False)"""
+    if orjson is None:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_canonical(obj):
+    """Serialize to compact JSON bytes with sorted keys, for hashing; unknown types go through str()"""
+    if orjson is None:
+        return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+
+
+def content_hash(match):
+    """
+    Hash a match's content in canonical form, ignoring UNHASHED_FIELDS
+
+    Both Firestore syncs store this as the document's content_hash field,
+    so either one can tell whether a document already holds the match.
+    """
+    content = {key: value for key, value in match.items() if key not in UNHASHED_FIELDS}
+    return hashlib.blake2b(dumps_canonical(content), digest_size=16).hexdigest()
+
+
+def load(filename):
+    """Read and parse a JSON file, straight from a memory map when orjson is available"""
+    with open(filename, 'rb') as f:
+        # mmap rejects empty files, and stdlib json can't parse a memoryview
+        if orjson is None or os.fstat(f.fileno()).st_size == 0:
+            return loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return orjson.loads(view)
+
+
+def save(obj, filename, fsync=True):
+    """
+    Write obj as JSON via a temp file and rename, so readers never see a partial write
+
+    Args:
+        obj: JSON-serializable object
+        filename: Destination path
+        fsync: Flush the temp file to disk before the rename; the rename alone
+            is enough to protect readers, fsync also survives a power loss
+    """
+    # A temp file of its own per writer: several scripts save the same file, and a
+    # shared name would let one writer truncate another's half-written temp file
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(dumps(obj))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        for attempt in range(REPLACE_ATTEMPTS):
+            try:
+                os.replace(tmp, filename)
+                break
+            except PermissionError:
+                if attempt == REPLACE_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+
+class CachedJsonFile:
+    """
+    A JSON file whose parsed contents are reused while its (mtime_ns, size) is unchanged
+
+    load() keeps returning the same object until the file changes, so callers
+    that modify it must write it back with save(). A failed save drops the
+    cached copy, and the next load() re-reads what is actually on disk.
+    """
+    
+    def __init__(self, filename, prepare=None):
+        """
+        Args:
+            filename: Path of the JSON file
+            prepare: Called once on each freshly parsed object, e.g. to attach derived fields
+        """
+        self.filename = filename
+        self.prepare = prepare
+        self._cached = None  # ((mtime_ns, size), parsed contents)
+    
+    def _stat_key(self):
+        st = os.stat(self.filename)
+        return (st.st_mtime_ns, st.st_size)
+    
+    def load(self):
+        """Parse the file, or return the cached object; raises like load()"""
+        key = self._stat_key()
+        if self._cached and self._cached[0] == key:
+            return self._cached[1]
+        
+        obj = load(self.filename)
+        if self.prepare:
+            self.prepare(obj)
+        self._cached = (key, obj)
+        return obj
+    
+    def save(self, obj, content=None, fsync=True):
+        """
+        Write obj to the file and make it what load() returns
+
+        Args:
+            obj: The object to cache
+            content: Written instead of obj when obj carries in-memory-only fields
+            fsync: See save()
+        """
+        try:
+            save(obj if content is None else content, self.filename, fsync)
+        except BaseException:
+            # obj holds changes that never reached disk
+            self._cached = None
+            raise
+        self._cached = (self._stat_key(), obj)
@@ -0,0 +1,68 @@
+import sys
+import asyncio
+from log_config import setup_logging
+from m3u8 import shutdown
+from real_time_syn import RealtimeFirestoreSync
+from refresh_m3u8 import MatchesMonitor, MATCHES_FILE, parse_intervals
+
+
+async def main():
+    """
+    Run the Firestore sync and the m3u8 refresh monitor in one process
+    
+    Both share one event loop: refreshed URLs are saved to the matches file,
+    which wakes the sync task and pushes them to Firestore.
+    """
+    setup_logging()
+    
+    args = sys.argv[1:]
+    
+    # --poll forces the sync's interval-based loop instead of file-system events
+    poll = '--poll' in args
+    # --reconcile rebuilds the sync's content hash map from Firestore first
+    reconcile = '--reconcile' in args
+    args = [arg for arg in args if arg not in ('--poll', '--reconcile')]
+    
+    check_interval, expiry_threshold = parse_intervals(args)
+    
+    sync = RealtimeFirestoreSync(
+        service_account_path='serviceAccountKey.json',
+        collection_name='matches',
+        json_file=MATCHES_FILE,
+        reconcile=reconcile
+    )
+    monitor = MatchesMonitor(MATCHES_FILE)
+    
+    try:
+        await asyncio.gather(
+            sync.watch_and_sync(check_interval, poll),
+            monitor.monitor(check_interval, expiry_threshold)
+        )
+    except Exception as e:
+        print(f"\n❌ Fatal error: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        # Close the shared scraper browser
+        await shutdown()
+
+
+if __name__ == "__main__":
+    """
+    Usage:
+        # Sync on file changes and refresh URLs expiring in ≤5 minutes every 60 seconds
+        python supervisor.py
+        
+        # Custom check interval and expiry threshold
+        python supervisor.py 120 10
+        
+        # Poll the matches file instead of watching for file-system events
+        python supervisor.py 120 10 --poll
+        
+        # Re-read Firestore before the first sync
+        python supervisor.py --reconcile
+    """
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n\n👋 Stopped by user")